@@ -0,0 +1,291 @@
+/*
+ * Native XXTEA, used by luna_kit.xxtea when it's available.
+ *
+ * Words are always read and written as little endian, to match the pure
+ * Python implementation.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <string.h>
+
+#define DELTA 0x9e3779b9
+#define MX (((z >> 5 ^ y << 2) + (y >> 3 ^ z << 4)) ^ ((sum ^ y) + (key[(p & 3) ^ e] ^ z)))
+
+
+static void
+load_words(uint32_t *v, const unsigned char *src, Py_ssize_t n)
+{
+    for (Py_ssize_t i = 0; i < n; i++) {
+        const unsigned char *b = src + i * 4;
+        v[i] = (uint32_t)b[0] | (uint32_t)b[1] << 8 | (uint32_t)b[2] << 16 | (uint32_t)b[3] << 24;
+    }
+}
+
+static void
+store_words(unsigned char *dst, const uint32_t *v, Py_ssize_t n)
+{
+    for (Py_ssize_t i = 0; i < n; i++) {
+        unsigned char *b = dst + i * 4;
+        b[0] = (unsigned char)(v[i]);
+        b[1] = (unsigned char)(v[i] >> 8);
+        b[2] = (unsigned char)(v[i] >> 16);
+        b[3] = (unsigned char)(v[i] >> 24);
+    }
+}
+
+static void
+btea_decrypt(uint32_t *v, Py_ssize_t n, const uint32_t key[4])
+{
+    uint32_t y, z, sum;
+    Py_ssize_t p;
+    unsigned rounds = 6 + 52 / n;
+    unsigned e;
+
+    sum = rounds * DELTA;
+    y = v[0];
+    do {
+        e = (sum >> 2) & 3;
+        for (p = n - 1; p > 0; p--) {
+            z = v[p - 1];
+            y = v[p] -= MX;
+        }
+        z = v[n - 1];
+        y = v[0] -= MX;
+        sum -= DELTA;
+    } while (--rounds);
+}
+
+static void
+btea_encrypt(uint32_t *v, Py_ssize_t n, const uint32_t key[4])
+{
+    uint32_t y, z, sum;
+    Py_ssize_t p;
+    unsigned rounds = 6 + 52 / n;
+    unsigned e;
+
+    sum = 0;
+    z = v[n - 1];
+    do {
+        sum += DELTA;
+        e = (sum >> 2) & 3;
+        for (p = 0; p < n - 1; p++) {
+            y = v[p + 1];
+            z = v[p] += MX;
+        }
+        y = v[0];
+        z = v[n - 1] += MX;
+    } while (--rounds);
+}
+
+static int
+parse_key(PyObject *obj, uint32_t key[4])
+{
+    PyObject *seq = PySequence_Fast(obj, "key must be a sequence of 4 ints");
+    if (seq == NULL) {
+        return -1;
+    }
+    if (PySequence_Fast_GET_SIZE(seq) != 4) {
+        PyErr_SetString(PyExc_ValueError, "key must be a sequence of 4 ints");
+        Py_DECREF(seq);
+        return -1;
+    }
+    for (Py_ssize_t i = 0; i < 4; i++) {
+        unsigned long value = PyLong_AsUnsignedLongMask(PySequence_Fast_GET_ITEM(seq, i));
+        if (value == (unsigned long)-1 && PyErr_Occurred()) {
+            Py_DECREF(seq);
+            return -1;
+        }
+        key[i] = (uint32_t)value;
+    }
+    Py_DECREF(seq);
+    return 0;
+}
+
+/* Run XXTEA over `nbytes` of `data` (a multiple of 4) and write the result to `out`. */
+static int
+run(const unsigned char *data, unsigned char *out, Py_ssize_t nbytes, const uint32_t key[4], int encrypt)
+{
+    Py_ssize_t n = nbytes / 4;
+    uint32_t *v;
+
+    if (n == 0) {
+        PyErr_SetString(PyExc_ValueError, "data must be at least 4 bytes");
+        return -1;
+    }
+
+#if PY_LITTLE_ENDIAN
+    /* The words are already in the right byte order, so work on the output
+       buffer directly instead of going through a temporary array. */
+    if ((uintptr_t)out % sizeof(uint32_t) == 0) {
+        Py_BEGIN_ALLOW_THREADS
+        if (out != data) {
+            memcpy(out, data, nbytes);
+        }
+        if (encrypt) {
+            btea_encrypt((uint32_t *)out, n, key);
+        }
+        else {
+            btea_decrypt((uint32_t *)out, n, key);
+        }
+        Py_END_ALLOW_THREADS
+        return 0;
+    }
+#endif
+
+    v = PyMem_RawMalloc(n * sizeof(uint32_t));
+    if (v == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    load_words(v, data, n);
+    if (encrypt) {
+        btea_encrypt(v, n, key);
+    }
+    else {
+        btea_decrypt(v, n, key);
+    }
+    store_words(out, v, n);
+    Py_END_ALLOW_THREADS
+
+    PyMem_RawFree(v);
+    return 0;
+}
+
+PyDoc_STRVAR(decrypt_doc,
+"decrypt(src, key)\n"
+"--\n"
+"\n"
+"Decrypt a bytes-like object. Its length must be a multiple of 4.");
+
+static PyObject *
+xxtea_decrypt(PyObject *module, PyObject *args)
+{
+    Py_buffer src;
+    PyObject *key_obj;
+    PyObject *result = NULL;
+    uint32_t key[4];
+
+    if (!PyArg_ParseTuple(args, "y*O:decrypt", &src, &key_obj)) {
+        return NULL;
+    }
+    if (parse_key(key_obj, key) < 0) {
+        goto done;
+    }
+    if (src.len % 4) {
+        PyErr_SetString(PyExc_ValueError, "data length must be a multiple of 4");
+        goto done;
+    }
+
+    result = PyBytes_FromStringAndSize(NULL, src.len);
+    if (result == NULL) {
+        goto done;
+    }
+    if (run(src.buf, (unsigned char *)PyBytes_AS_STRING(result), src.len, key, 0) < 0) {
+        Py_CLEAR(result);
+    }
+
+done:
+    PyBuffer_Release(&src);
+    return result;
+}
+
+PyDoc_STRVAR(encrypt_doc,
+"encrypt(src, key)\n"
+"--\n"
+"\n"
+"Encrypt a bytes-like object. It's padded with null bytes to a multiple of 4.");
+
+static PyObject *
+xxtea_encrypt(PyObject *module, PyObject *args)
+{
+    Py_buffer src;
+    PyObject *key_obj;
+    PyObject *result = NULL;
+    uint32_t key[4];
+    Py_ssize_t padded;
+    unsigned char *out;
+
+    if (!PyArg_ParseTuple(args, "y*O:encrypt", &src, &key_obj)) {
+        return NULL;
+    }
+    if (parse_key(key_obj, key) < 0) {
+        goto done;
+    }
+
+    padded = (src.len + 3) & ~(Py_ssize_t)3;
+    result = PyBytes_FromStringAndSize(NULL, padded);
+    if (result == NULL) {
+        goto done;
+    }
+    out = (unsigned char *)PyBytes_AS_STRING(result);
+    memcpy(out, src.buf, src.len);
+    memset(out + src.len, 0, padded - src.len);
+
+    if (run(out, out, padded, key, 1) < 0) {
+        Py_CLEAR(result);
+    }
+
+done:
+    PyBuffer_Release(&src);
+    return result;
+}
+
+PyDoc_STRVAR(decrypt_into_doc,
+"decrypt_into(buffer, key)\n"
+"--\n"
+"\n"
+"Decrypt a writable bytes-like object in place. Its length must be a multiple of 4.");
+
+static PyObject *
+xxtea_decrypt_into(PyObject *module, PyObject *args)
+{
+    Py_buffer buffer;
+    PyObject *key_obj;
+    PyObject *result = NULL;
+    uint32_t key[4];
+
+    if (!PyArg_ParseTuple(args, "w*O:decrypt_into", &buffer, &key_obj)) {
+        return NULL;
+    }
+    if (parse_key(key_obj, key) < 0) {
+        goto done;
+    }
+    if (buffer.len % 4) {
+        PyErr_SetString(PyExc_ValueError, "data length must be a multiple of 4");
+        goto done;
+    }
+    if (run(buffer.buf, buffer.buf, buffer.len, key, 0) < 0) {
+        goto done;
+    }
+
+    result = Py_NewRef(Py_None);
+
+done:
+    PyBuffer_Release(&buffer);
+    return result;
+}
+
+static PyMethodDef xxtea_methods[] = {
+    {"decrypt", xxtea_decrypt, METH_VARARGS, decrypt_doc},
+    {"encrypt", xxtea_encrypt, METH_VARARGS, encrypt_doc},
+    {"decrypt_into", xxtea_decrypt_into, METH_VARARGS, decrypt_into_doc},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef xxtea_module = {
+    PyModuleDef_HEAD_INIT,
+    "luna_kit._xxtea",
+    "Native XXTEA implementation.",
+    -1,
+    xxtea_methods,
+};
+
+PyMODINIT_FUNC
+PyInit__xxtea(void)
+{
+    return PyModule_Create(&xxtea_module);
+}
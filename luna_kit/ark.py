@@ -1,20 +1,22 @@
 import hashlib
 import io
 import logging
+import mmap
 import os
 import struct
 import sys
+import threading
 import warnings
 import zlib
 from collections.abc import Callable, Iterable, Iterator
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import pairwise
 from ctypes import *
 from dataclasses import dataclass
 from datetime import datetime
-from typing import IO, Annotated, Any, BinaryIO, Type
+from typing import IO, Any, BinaryIO
 
 try:
-    import dataclasses_struct as dcs
     import zstandard
     from lxml import etree
 except ImportError as e:
@@ -23,26 +25,55 @@ except ImportError as e:
 
 from . import enums, types, xxtea
 from .file_utils import (PathOrBinaryFile, get_filesize, is_binary_file,
-                         is_text_file, open_binary)
-from .utils import posix_path, read_ascii_string, trailing_slash
+                         is_text_file, move_file_data, open_binary)
+from .utils import posix_path, trailing_slash
 
 
 def metadata_by_file_location(metadata: 'FileMetadata'):
     return metadata.file_location
 
-@dcs.dataclass_struct(size = 'std', byteorder='little')
-class _v1Header():
-    file_count: dcs.U32 = 0
-    metadata_offset: dcs.U32 = 0
-    version: dcs.U32 = 0
+# zstd contexts are expensive to set up, so they're reused, but they aren't
+# safe to share between threads, so each thread gets its own.
+_zstd_contexts = threading.local()
 
-@dcs.dataclass_struct(size = 'std', byteorder='little')
-class _v3v4Header():
-    file_count: dcs.U32 = 0
-    metadata_offset: dcs.U32 = 0
-    version: dcs.U32 = 0
-    metadata_length: dcs.U32 = 0
-    unknown: Annotated[bytes, 16] = b'\x00' * 16
+def _zstd_decompressor() -> zstandard.ZstdDecompressor:
+    try:
+        return _zstd_contexts.decompressor
+    except AttributeError:
+        decompressor = _zstd_contexts.decompressor = zstandard.ZstdDecompressor()
+        return decompressor
+
+def _zstd_compressor() -> zstandard.ZstdCompressor:
+    try:
+        return _zstd_contexts.compressor
+    except AttributeError:
+        compressor = _zstd_contexts.compressor = zstandard.ZstdCompressor(level = 9)
+        return compressor
+
+# The decompressed size is known up front, so both decompressors allocate the
+# output once instead of growing it.
+def _zlib_decompress(data: bytes | memoryview, size: int) -> bytes:
+    return zlib.decompress(data, bufsize = max(size, 1))
+
+def _zstd_decompress(data: bytes | memoryview, size: int) -> bytes:
+    return _zstd_decompressor().decompress(data, max_output_size = size)
+
+def _no_decompress(data: bytes | memoryview, size: int) -> bytes | memoryview:
+    return data
+
+# How file data and the metadata block are compressed in each ark version.
+# These get bound to the ARK once the header is read, so reading files
+# doesn't have to check the version every time.
+_FILE_DECOMPRESSORS: dict[int, Callable[[bytes | memoryview, int], bytes]] = {
+    1: _zlib_decompress,
+    3: _zstd_decompress,
+    4: _zstd_decompress,
+}
+_METADATA_DECOMPRESSORS: dict[int, Callable[[bytes | memoryview, int], bytes | memoryview]] = {
+    1: _no_decompress,
+    3: _zstd_decompress,
+    4: _zstd_decompress,
+}
 
 @dataclass
 class Header:
@@ -54,64 +85,41 @@ class Header:
     
     @property
     def struct_size(self):
-        return dcs.get_struct_size(_HEADER_STRUCTS[self.version])
+        return _HEADER_STRUCTS[self.version].size
     
     def pack(self):
         match self.version:
             case 1:
-                data = _v1Header(
-                    file_count = self.file_count,
-                    metadata_offset = self.metadata_offset,
-                    version = self.version
+                return _v1_HEADER_STRUCT.pack(
+                    self.file_count,
+                    self.metadata_offset,
+                    self.version,
                 )
             case 3 | 4:
-                data = _v3v4Header(
-                    file_count = self.file_count,
-                    metadata_offset = self.metadata_offset,
-                    version = self.version,
-                    metadata_length = self.metadata_length,
-                    unknown = self.unknown,
+                return _v3v4_HEADER_STRUCT.pack(
+                    self.file_count,
+                    self.metadata_offset,
+                    self.version,
+                    self.metadata_length,
+                    self.unknown,
                 )
             case _:
                 raise ValueError(f'Invalid ark version: {self.version}')
-        
-        return data.pack()
-    
-_HEADER_STRUCTS = {
-    1: _v1Header,
-    3: _v3v4Header,
-    4: _v3v4Header,
-}
 
 
 HEADER_FORMAT = "3I"
 
+# Pre-compiled structs, so the format isn't parsed again for every header and
+# metadata entry.
+_v1_HEADER_STRUCT = struct.Struct('<3I')
+_v3v4_HEADER_STRUCT = struct.Struct('<4I16s')
+
+_HEADER_STRUCTS: dict[int, struct.Struct] = {
+    1: _v1_HEADER_STRUCT,
+    3: _v3v4_HEADER_STRUCT,
+    4: _v3v4_HEADER_STRUCT,
+}
 
-@dcs.dataclass_struct(size = 'std', byteorder='little')
-class _v1v3FileMetadataStruct:
-    filename: Annotated[bytes, 128]
-    pathname: Annotated[bytes, 128]
-    file_location: dcs.U32
-    original_filesize: dcs.U32
-    compressed_size: dcs.U32
-    encrypted_size: dcs.U32
-    timestamp: dcs.U32
-    md5sum: Annotated[bytes, 16]
-    priority: dcs.U32
-
-@dcs.dataclass_struct(size = 'std', byteorder='little')
-class _v4FileMetadataStruct:
-    filename: Annotated[bytes, 128]
-    pathname: Annotated[bytes, 128]
-    file_location: dcs.U32
-    original_filesize: dcs.U32
-    compressed_size: dcs.U32
-    encrypted_size: dcs.U32
-    timestamp: dcs.U32
-    unknown1: dcs.U32
-    unknown2: Annotated[bytes, 40]
-    md5sum: Annotated[bytes, 16]
-    priority: dcs.U32
 
 @dataclass
 class FileMetadata:
@@ -135,7 +143,7 @@ class FileMetadata:
     
     @property
     def struct_size(self):
-        return dcs.get_struct_size(_METADATA_STRUCTS[self.version])
+        return _METADATA_STRUCTS[self.version].size
     
     # def __post_init__(self):
     #     
@@ -162,60 +170,84 @@ class FileMetadata:
         self._priority = self.priority
     
     @property
-    def full_path(self):
-        return os.path.join(self.pathname, self.filename)
+    def full_path(self) -> str:
+        # Cached, since this is used for every lookup in `ARKMetadataCollection`.
+        # The cache is tied to the current `pathname` and `filename` objects, so
+        # assigning either one invalidates it.
+        cache = self.__dict__.get('_full_path_cache')
+        if cache is None or cache[0] is not self.pathname or cache[1] is not self.filename:
+            cache = self._full_path_cache = (
+                self.pathname,
+                self.filename,
+                posix_path(os.path.join(self.pathname, self.filename)),
+            )
+        return cache[2]
     
     @full_path.setter
     def full_path(self, path: str):
         self.pathname = posix_path(os.path.dirname(path))
         self.filename = posix_path(os.path.basename(path))
     
-    def pack(self, version = None):
+    def pack(self, version = None) -> bytes:
+        buffer = bytearray(_METADATA_STRUCTS[version or self.version].size)
+        self.pack_into(buffer, 0, version)
+        return bytes(buffer)
+    
+    def pack_into(self, buffer: bytearray, offset: int, version = None):
+        """Pack this metadata directly into `buffer` at `offset`.
+
+        Args:
+            buffer (bytearray): Writable buffer to pack into.
+            offset (int): Offset in `buffer` to start writing at.
+            version (int | None, optional): ARK version to pack as. Defaults to `self.version`.
+        """
         self.__save_original()
         if version:
             self.version = version
         match self.version:
             case 1 | 3:
-                data = _v1v3FileMetadataStruct(
-                    filename = self.filename.encode('ascii', errors = 'ignore'),
-                    pathname = self.pathname.encode('ascii', errors = 'ignore'),
-                    file_location = self.file_location,
-                    original_filesize = self.original_filesize,
-                    compressed_size = self.compressed_size,
-                    encrypted_size = self.encrypted_size,
-                    timestamp = int(self.timestamp),
-                    md5sum = self.md5sum,
-                    priority = self.priority,
+                _v1v3_METADATA_STRUCT.pack_into(
+                    buffer, offset,
+                    self.filename.encode('ascii', errors = 'ignore'),
+                    self.pathname.encode('ascii', errors = 'ignore'),
+                    self.file_location,
+                    self.original_filesize,
+                    self.compressed_size,
+                    self.encrypted_size,
+                    int(self.timestamp),
+                    self.md5sum,
+                    self.priority,
                 )
             case 4:
-                data = _v4FileMetadataStruct(
-                    filename = self.filename.encode('ascii', errors = 'ignore'),
-                    pathname = self.pathname.encode('ascii', errors = 'ignore'),
-                    file_location = self.file_location,
-                    original_filesize = self.original_filesize,
-                    compressed_size = self.compressed_size,
-                    encrypted_size = self.encrypted_size,
-                    timestamp = int(self.timestamp),
-                    md5sum = self.md5sum,
-                    priority = self.priority,
-                    unknown1 = self.unknown1,
-                    unknown2 = self.unknown2,
+                _v4_METADATA_STRUCT.pack_into(
+                    buffer, offset,
+                    self.filename.encode('ascii', errors = 'ignore'),
+                    self.pathname.encode('ascii', errors = 'ignore'),
+                    self.file_location,
+                    self.original_filesize,
+                    self.compressed_size,
+                    self.encrypted_size,
+                    int(self.timestamp),
+                    self.unknown1 or 0,
+                    self.unknown2 or b'',
+                    self.md5sum,
+                    self.priority,
                 )
             case _:
                 raise ValueError(f'Invalid ark version: {self.version}')
-        
-        return data.pack()
-            
-
-_METADATA_STRUCTS: dict[int, Type[_v1v3FileMetadataStruct] | Type[_v4FileMetadataStruct]] = {
-    1: _v1v3FileMetadataStruct,
-    3: _v1v3FileMetadataStruct,
-    4: _v4FileMetadataStruct,
-}
 
 
 FILE_METADATA_FORMAT = "128s128s5I16sI"
 
+_v1v3_METADATA_STRUCT = struct.Struct('<' + FILE_METADATA_FORMAT)
+_v4_METADATA_STRUCT = struct.Struct('<128s128s6I40s16sI')
+
+_METADATA_STRUCTS: dict[int, struct.Struct] = {
+    1: _v1v3_METADATA_STRUCT,
+    3: _v1v3_METADATA_STRUCT,
+    4: _v4_METADATA_STRUCT,
+}
+
 class ARK():
     KEY = [0x3d5b2a34, 0x923fff10, 0x00e346a4, 0x0c74902b]
     
@@ -223,13 +255,12 @@ class ARK():
     unknown_header_data: bytes
     _files: 'ARKMetadataCollection[FileMetadata]'
     
-    _decompresser = zstandard.ZstdDecompressor()
-    
     __files_block: io.BytesIO
     
     def __init__(
         self,
         file: str | bytes | bytearray | BinaryIO | None = None,
+        verify: bool = True,
     ) -> None:
         """Extract `.ark` files.
         
@@ -239,19 +270,23 @@ class ARK():
 
         Args:
             file (str | bytes | bytearray | BinaryIO | None, optional): Input file. Defaults to None.
-            output (str | None, optional): Optional output folder to extract files to. Defaults to None.
+            verify (bool, optional): Check the md5 hash of every file that gets read. Defaults to True.
         """
+        self.verify = verify
+        self._mmap: mmap.mmap | None = None
         self.__open_file: BinaryIO | None = None
         self.__close_file: bool = False
         self._files = ARKMetadataCollection()
         self.__files_block = io.BytesIO()
         self.header = Header()
+        self._bind_version(self.header.version)
         
         self.file = file
     
     @property
-    def files(self):
-        return deepcopy(self._files)
+    def files(self) -> 'ARKMetadataCollection[FileMetadata]':
+        """Copy of the file list. The list is a shallow copy, so the `FileMetadata` objects are shared with the ark and shouldn't be modified."""
+        return self._files.copy()
     
     @property
     def data_version(self):
@@ -282,6 +317,7 @@ class ARK():
         self.__close_file = True
         if isinstance(self.file, str):
             self.__open_file = open(self.file, 'r+b')
+            self._map_file()
         elif isinstance(self.file, (bytes, bytearray)):
             self.__open_file = io.BytesIO(self.file)
         elif is_binary_file(self.file):
@@ -300,11 +336,27 @@ class ARK():
         except:
             # Apparently logging.debug is None when you exit the repl
             pass
+        self._unmap_file()
         if self.__close_file:
             if not self.__open_file.closed:
                 self.__open_file.close()
         self.__close_file = False
     
+    def _map_file(self):
+        """Memory map the open file for reading, so file data can be read without copying it. Only done for files opened from a path."""
+        self._unmap_file()
+        self.__open_file.flush()
+        try:
+            self._mmap = mmap.mmap(self.__open_file.fileno(), 0, access = mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # empty files can't be mapped
+            self._mmap = None
+    
+    def _unmap_file(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+    
     def __del__(self):
         self.close()
     
@@ -327,46 +379,142 @@ class ARK():
         file.seek(0)
         
         self.header = self._read_header(file)
+        self._bind_version(self.header.version)
         self._files = self._read_metadata(file)
     
+    def _bind_version(self, version: int):
+        """Pick the version specific functions used for reading this ark."""
+        if version not in _FILE_DECOMPRESSORS:
+            raise ValueError(f'Unknown file version {version}')
+        
+        self._decompress_file = _FILE_DECOMPRESSORS[version]
+        self._decompress_metadata = _METADATA_DECOMPRESSORS[version]
+    
 
     def write(self, file: BinaryIO):
         if not is_binary_file(file):
             raise TypeError('file must be file-like object open in binary write mode')
         
+        # Read the file data out of the loaded ark first, since `file` may be
+        # the same file and gets truncated below.
+        if self.__open_file is not None and not self.__open_file.closed:
+            self._get_file_block(self.__open_file)
+        
+        mapped = self._mmap is not None and file is self.__open_file
+        if mapped:
+            self._unmap_file()
+        
         file.seek(0)
         file.truncate()
         
         metadata_block = self._write_metadata(file)
-        self.header.metadata_offset = self.header.struct_size + len(self.__files_block.getvalue())
-        self.header.metadata_length = len(metadata_block)
         
-        file.write(self._write_header(file))
-        file.write(self.__files_block.getvalue())
+        # getbuffer() gives a view of the data, instead of copying the whole block with getvalue()
+        with self.__files_block.getbuffer() as files_block:
+            self.header.metadata_offset = self.header.struct_size + len(files_block)
+            self.header.metadata_length = len(metadata_block)
+            
+            file.write(self._write_header(file))
+            file.write(files_block)
         file.write(metadata_block)
         self.__files_block.seek(0)
         self.__files_block.truncate()
+        
+        if mapped:
+            self._map_file()
     
     def _get_file_block(self, file: BinaryIO):
-        self._files.sort(key = metadata_by_file_location)
-        first_file = self._files[0]
+        self._files._ensure_sorted()
         self.__files_block.seek(0)
         self.__files_block.truncate()
         
+        if not len(self._files):
+            return
+        
+        first_file = self._files[0]
         file.seek(first_file.file_location)
-        self.__files_block.write(file.read(self.header.metadata_offset))
+        self.__files_block.write(file.read(self.header.metadata_offset - first_file.file_location))
     
     def extract(self, file: FileMetadata):
         return self.read_file(file)
     
     def read_file(self, file: FileMetadata):
-        return self._get_file_data(file, self.__open_file)
+        return self._get_file_data(file, self._mmap if self._mmap is not None else self.__open_file)
+    
+    def extract_all(
+        self,
+        output: str,
+        files: Iterable[FileMetadata] | None = None,
+        workers: int | None = None,
+        ignore_errors: bool = False,
+        callback: Callable[[FileMetadata, Exception | None], Any] | None = None,
+    ) -> list[tuple[FileMetadata, Exception]]:
+        """Extract files to a folder, using multiple threads.
+        
+        Each file is decrypted, decompressed, and saved on a worker thread. zstd and file writes release the GIL, so this scales with the number of threads.
+
+        Args:
+            output (str): Output folder.
+            files (Iterable[FileMetadata] | None, optional): Files to extract. Defaults to all files.
+            workers (int | None, optional): Number of threads to use. Defaults to the number of CPUs.
+            ignore_errors (bool, optional): Keep going when a file can't be extracted, instead of raising the error. Defaults to False.
+            callback (Callable[[FileMetadata, Exception | None], Any] | None, optional): Called on the calling thread every time a file finishes, with the error if it failed. Defaults to None.
+
+        Returns:
+            list[tuple[FileMetadata, Exception]]: Files that couldn't be extracted, when `ignore_errors` is True.
+        """
+        if files is None:
+            files = self._files
+        
+        read_lock = threading.Lock()
+        
+        def extract(metadata: FileMetadata):
+            if self._mmap is not None:
+                file = self._get_file_data(metadata, self._mmap)
+            else:
+                # File objects can't be read from multiple threads, but
+                # everything after reading can still run in parallel.
+                with read_lock:
+                    self.__open_file.seek(metadata.file_location, os.SEEK_SET)
+                    data = self.__open_file.read(metadata.actual_size)
+                file = self._decode_file_data(metadata, data)
+            
+            file.save(os.path.join(output, metadata.full_path))
+        
+        failed = []
+        
+        executor = ThreadPoolExecutor(max_workers = workers or os.cpu_count())
+        try:
+            futures = {executor.submit(extract, metadata): metadata for metadata in files}
+            
+            for future in as_completed(futures):
+                metadata = futures[future]
+                error = future.exception()
+                if error is not None:
+                    error.add_note(f'file: {metadata.full_path}')
+                    if not ignore_errors:
+                        raise error
+                    failed.append((metadata, error))
+                
+                if callback is not None:
+                    callback(metadata, error)
+        finally:
+            executor.shutdown(cancel_futures = True)
+        
+        return failed
 
     def add_file(self, file: 'ARKFile'):
         data, metadata = file.pack()
+        
+        # The map has to be dropped while writing, since the file changes size
+        # (and mapped files can't be truncated on Windows).
+        mapped = self._mmap is not None
+        self._unmap_file()
         self._write_file(data, metadata, self.__open_file)
+        if mapped:
+            self._map_file()
     
-    def _read_header(self, file: IO) -> _v3v4Header:
+    def _read_header(self, file: IO) -> Header:
         """Read the header of a `.ark` file.
 
         Args:
@@ -384,18 +532,24 @@ class ARK():
         file.seek(0)
         
         if version not in _HEADER_STRUCTS:
-            raise ValueError(f'Unknown file version {header.ark_version}')
+            raise ValueError(f'Unknown file version {version}')
         
-        raw_header: _v1Header | _v3v4Header = _HEADER_STRUCTS[version].from_packed(
-            file.read(dcs.get_struct_size(_HEADER_STRUCTS[version]))
-        )
+        header_struct = _HEADER_STRUCTS[version]
+        raw_header = header_struct.unpack(file.read(header_struct.size))
+        
+        if version == 1:
+            file_count, metadata_offset, version = raw_header
+            metadata_length = filesize - metadata_offset
+            unknown = b''
+        else:
+            file_count, metadata_offset, version, metadata_length, unknown = raw_header
         
         header = Header(
-            version = raw_header.version,
-            file_count = raw_header.file_count,
-            metadata_offset = raw_header.metadata_offset,
-            metadata_length = raw_header.metadata_length if hasattr(raw_header, 'metadata_length') else filesize - raw_header.metadata_offset,
-            unknown = raw_header.unknown if hasattr(raw_header, 'unknown') else b'',
+            version = version,
+            file_count = file_count,
+            metadata_offset = metadata_offset,
+            metadata_length = metadata_length,
+            unknown = unknown,
         )
         
         return header
@@ -407,7 +561,7 @@ class ARK():
         return self.header.pack()
 
 
-    def _read_metadata(self, file: IO) -> None | list[_v1v3FileMetadataStruct]:
+    def _read_metadata(self, file: IO) -> 'ARKMetadataCollection[FileMetadata]':
         filesize: int = None
         
         file.seek(0, os.SEEK_END)
@@ -421,7 +575,8 @@ class ARK():
         metadata_size = xxtea.get_phdr_size(filesize - self.header.metadata_offset)
         # print(f'metadata size: {metadata_size}')
         
-        raw_metadata_size = self.header.file_count * dcs.get_struct_size(_v1v3FileMetadataStruct)
+        metadata_struct = _METADATA_STRUCTS[self.header.version]
+        raw_metadata_size = self.header.file_count * metadata_struct.size
         # print(f'raw metadata size: {raw_metadata_size}')
         
         
@@ -435,51 +590,70 @@ class ARK():
 
         self.decrypted_metadata = metadata
         
-        if self.header.version == 1:
-            raw_metadata = metadata
-        elif self.header.version in [3, 4]:
-            raw_metadata = self._decompresser.decompress(metadata, raw_metadata_size)
-        else:
-            raise ValueError(f'Unknown file version {self.header.version}')
-            
-            
+        raw_metadata = self._decompress_metadata(metadata, raw_metadata_size)
         self.raw_metadata = raw_metadata
 
-        metadata_struct = _METADATA_STRUCTS[self.header.version]
-
-        metadata_size = dcs.get_struct_size(metadata_struct)
-        result = ARKMetadataCollection()
-        for file_index in range(self.header.file_count):
-            offset = file_index * metadata_size
-            
-            file_result: _v1v3FileMetadataStruct | _v4FileMetadataStruct = metadata_struct.from_packed(
-                raw_metadata[offset : offset + metadata_size]
+        version = self.header.version
+        entries = metadata_struct.iter_unpack(memoryview(raw_metadata)[:raw_metadata_size])
+        
+        # The layout is picked once here, instead of checking the version for every entry.
+        if version == 4:
+            return ARKMetadataCollection(
+                FileMetadata(
+                    filename = filename.partition(b'\x00')[0].decode('ascii', errors = 'ignore'),
+                    pathname = pathname.partition(b'\x00')[0].decode('ascii', errors = 'ignore'),
+                    file_location = file_location,
+                    original_filesize = original_filesize,
+                    compressed_size = compressed_size,
+                    encrypted_size = encrypted_size,
+                    timestamp = timestamp,
+                    md5sum = md5sum,
+                    unknown1 = unknown1,
+                    unknown2 = unknown2,
+                    priority = priority,
+                    
+                    version = version,
+                ) for (
+                    filename, pathname, file_location, original_filesize,
+                    compressed_size, encrypted_size, timestamp,
+                    unknown1, unknown2, md5sum, priority,
+                ) in entries
             )
-            
-            
-            result.append(FileMetadata(
-                filename = read_ascii_string(file_result.filename),
-                pathname = read_ascii_string(file_result.pathname),
-                file_location = file_result.file_location,
-                original_filesize = file_result.original_filesize,
-                compressed_size = file_result.compressed_size,
-                encrypted_size = file_result.encrypted_size,
-                timestamp = file_result.timestamp,
-                md5sum = bytes.fromhex(file_result.md5sum.hex()) if hasattr(file_result, 'md5sum') else None,
-                unknown1 = file_result.unknown1 if hasattr(file_result, 'unknown1') else None,
-                unknown2 = file_result.unknown2 if hasattr(file_result, 'unknown2') else None,
-                priority = file_result.priority,
+        
+        return ARKMetadataCollection(
+            FileMetadata(
+                filename = filename.partition(b'\x00')[0].decode('ascii', errors = 'ignore'),
+                pathname = pathname.partition(b'\x00')[0].decode('ascii', errors = 'ignore'),
+                file_location = file_location,
+                original_filesize = original_filesize,
+                compressed_size = compressed_size,
+                encrypted_size = encrypted_size,
+                timestamp = timestamp,
+                md5sum = md5sum,
+                unknown1 = None,
+                unknown2 = None,
+                priority = priority,
                 
-                version = self.header.version,
-            ))
-
-        return result
+                version = version,
+            ) for (
+                filename, pathname, file_location, original_filesize,
+                compressed_size, encrypted_size, timestamp,
+                md5sum, priority,
+            ) in entries
+        )
 
-    def _get_file_data(self, metadata: FileMetadata, file: BinaryIO):
-        file.seek(metadata.file_location, os.SEEK_SET)
+    def _get_file_data(self, metadata: FileMetadata, file: BinaryIO | mmap.mmap):
+        if isinstance(file, mmap.mmap):
+            # Read straight out of the map. The view is released afterwards,
+            # otherwise the map can't be closed.
+            with memoryview(file)[metadata.file_location : metadata.file_location + metadata.actual_size] as file_data:
+                return self._decode_file_data(metadata, file_data)
         
-        file_data = file.read(metadata.encrypted_size if metadata.encrypted_size else metadata.compressed_size)
+        file.seek(metadata.file_location, os.SEEK_SET)
         
+        return self._decode_file_data(metadata, file.read(metadata.actual_size))
+    
+    def _decode_file_data(self, metadata: FileMetadata, file_data: bytes | memoryview):
         compressed = False
         encrypted = False
 
@@ -489,19 +663,16 @@ class ARK():
         
         if (metadata.compressed_size != metadata.original_filesize):
             compressed = True
-            if self.header.version == 1:
-                file_data = zlib.decompress(file_data)
-            elif self.header.version >= 3:
-                file_data = self._decompresser.decompress(file_data, metadata.original_filesize)
+            file_data = self._decompress_file(file_data, metadata.original_filesize)
         
         file_data = file_data[:metadata.original_filesize]
         
-        if metadata.md5sum is not None:
-            if hashlib.md5(file_data).hexdigest() != metadata.md5sum.hex():
-                warnings.warn(f'file "{posix_path(os.path.join(metadata.pathname, metadata.filename))}" hash does not match "{metadata.md5sum.hex()}"')
+        if self.verify and metadata.md5sum is not None:
+            if hashlib.md5(file_data).digest() != metadata.md5sum:
+                warnings.warn(f'file "{metadata.full_path}" hash does not match "{metadata.md5sum.hex()}"')
         
         return ARKFile(
-            os.path.join(metadata.pathname, metadata.filename),
+            metadata.full_path,
             file_data,
             encrypted = encrypted,
             compressed = compressed,
@@ -510,30 +681,30 @@ class ARK():
         )
     
     def _write_file(self, data: bytes, metadata: FileMetadata, file: BinaryIO):
-        self._files.sort(key = metadata_by_file_location)
-        
-        self._get_file_block(file)
+        """Write a file into the ark in place.
+
+        New files are written at the end of the file data. When replacing a file, the data after it is shifted in chunks rather than read into memory. The metadata and header are then rewritten.
+        """
+        self._files._ensure_sorted()
         
-        header_offset = self.header.struct_size
+        files_end = self.header.metadata_offset
+        if not len(self._files):
+            files_end = self.header.struct_size
         
-        if metadata.file_location < 0:
-            if len(self._files):
-                metadata.file_location = self._files[-1].file_location + self._files[-1].actual_size
-            else:
-                metadata.file_location = self.header.struct_size
         if metadata.full_path not in self._files:
-            metadata.file_location = self._files[-1].file_location + self._files[-1].actual_size
+            metadata.file_location = files_end
             self._files.append(metadata)
-            self.__files_block.seek(metadata.file_location - header_offset)
-            self.__files_block.truncate()
-            self.__files_block.write(data)
-            self.header.metadata_offset = metadata.file_location + metadata.actual_size
+            
+            file.seek(metadata.file_location)
+            file.write(data)
+            files_end = metadata.file_location + metadata.actual_size
         else:
-            found = self._files[metadata.full_path]
-            current_index = self._files.index(found)
+            current_index = self._files.index(metadata.full_path)
+            found = self._files[current_index]
             rest_start = found.file_location + found.actual_size
-            self.__files_block.seek(rest_start - header_offset)
-            rest = file.read()
+            offset = metadata.actual_size - found.actual_size
+            
+            move_file_data(file, rest_start, files_end, offset)
 
             metadata.file_location = found.file_location
             found.compressed_size = metadata.compressed_size
@@ -545,19 +716,26 @@ class ARK():
             found.unknown1 = metadata.unknown1
             found.unknown2 = metadata.unknown2
             
-            self.__files_block.seek(metadata.file_location - header_offset)
-            file.truncate()
+            file.seek(found.file_location)
             file.write(data)
-            offset = file.tell() - rest_start
-            file.write(rest)
-
+            
             for i in range(current_index + 1, len(self._files)):
                 self._files[i].file_location += offset
+            files_end += offset
         
-        self.write(file)
+        metadata_block = self._write_metadata(file)
+        self.header.metadata_offset = files_end
+        self.header.metadata_length = len(metadata_block)
+        
+        file.seek(files_end)
+        file.write(metadata_block)
+        file.truncate()
+        
+        file.seek(0)
+        file.write(self._write_header(file))
         
 
-    def _pack_files(self) -> list[tuple[bytes, _v1v3FileMetadataStruct]]:
+    def _pack_files(self) -> list[tuple[bytes, FileMetadata]]:
         packed = []
         
         for file in self._files:
@@ -571,23 +749,21 @@ class ARK():
         return packed
     
     def _write_metadata(self, file: BinaryIO):
-        self._files.sort(key = metadata_by_file_location)
+        self._files._ensure_sorted()
         # print('filesize', get_filesize(file))
         # print('metadata_offset', self.header.metadata_offset)
 
-        expected_size = self.header.file_count * dcs.get_struct_size(_METADATA_STRUCTS[self.header.version])
-        
-        metadata_block = b''
-        for metadata in self._files:
-            metadata_block += metadata.pack(self.header.version)
+        metadata_size = _METADATA_STRUCTS[self.header.version].size
         
-        # print('expected size:', expected_size)
-        # print('actual size:', len(metadata_block))
+        metadata_block = bytearray(len(self._files) * metadata_size)
+        for index, metadata in enumerate(self._files):
+            metadata.pack_into(metadata_block, index * metadata_size, self.header.version)
+        metadata_block = bytes(metadata_block)
         
         if self.header.version == 1:
             pass
         elif self.header.version in [3, 4]:
-            metadata_block = zstandard.compress(metadata_block, 9)
+            metadata_block = _zstd_compressor().compress(metadata_block)
         
         # print('compressed size', len(metadata_block))
         metadata_block = xxtea.encrypt(metadata_block, self.KEY)
@@ -613,6 +789,8 @@ class ARKFile():
             data (bytes): File data.
         """
         self.fullpath = str(filename)
+        # Views (like the ones read from an ark's memory map) get copied, so
+        # the file doesn't keep the ark's map alive. bytes are used as is.
         self.data: bytes = bytes(data)
         
         self.compressed = compressed
@@ -656,7 +834,6 @@ class ARKFile():
         Returns:
             str: full path
         """
-        self.fullpath = self._fullpath
         return self._fullpath
 
     @fullpath.setter
@@ -676,8 +853,21 @@ class ARKFile():
         
         os.makedirs(os.path.dirname(path), exist_ok = True)
         
-        with open(path, 'wb') as file:
-            file.write(self.data)
+        # The whole file is already in memory, so write it straight to the fd
+        # instead of going through a buffered file object.
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            if len(self.data) > (1 << 20) and hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(fd, 0, len(self.data))
+                except OSError:
+                    pass
+            
+            view = memoryview(self.data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
         
         
         if self.timestamp > datetime.now():
@@ -695,13 +885,13 @@ class ARKFile():
             compressed_size = 0,
             encrypted_size = 0,
             timestamp = self.timestamp.timestamp(),
-            md5sum = bytes.fromhex(hashlib.md5(result).hexdigest()),
+            md5sum = hashlib.md5(result).digest(),
             priority = self.priority,
             unknown1 = None,
             unknown2 = None,
         )
         if self.compressed:
-            result = zstandard.compress(result, 9)
+            result = _zstd_compressor().compress(result)
             metadata.compressed_size = len(result)
 
         if self.encrypted:
@@ -712,11 +902,34 @@ class ARKFile():
 
 
 class ARKMetadataCollection(list):
+    """List of `FileMetadata` that can also be indexed by full path.
+
+    Full paths are kept in a dict index, so lookups by path don't have to scan
+    the whole list. If you rename a `FileMetadata` that's already in the
+    collection, call `reindex()` afterwards.
+    
+    The collection also tracks whether it's sorted by file location, so
+    `_ensure_sorted()` only sorts when something could have changed the
+    order. If you move a file's `file_location` out of order, call `sort()`.
+    """
+    
+    _by_path: dict[str, int]
+    _sorted: bool
+    
     def __init__(self, metadatas: Iterable[FileMetadata] | None = None):
         if metadatas is None:
             super().__init__()
         else:
             super().__init__(metadatas)
+        
+        self._sorted = all(a.file_location <= b.file_location for a, b in pairwise(self))
+        self.reindex()
+    
+    def reindex(self):
+        """Rebuild the full path index."""
+        self._by_path = {}
+        for index, metadata in enumerate(self):
+            self._by_path.setdefault(metadata.full_path, index)
     
     def get(self, key: str | int, default: Any = None) -> FileMetadata | Any:
         try:
@@ -731,34 +944,90 @@ class ARKMetadataCollection(list):
             self.__setitem__(key, default)
             return default
     
-    def sort(self, *, key: Callable[[FileMetadata], Any] | None = lambda m: m.file_location, reverse: bool = False):
-        return super().sort(key = key, reverse = reverse)
+    def sort(self, *, key: Callable[[FileMetadata], Any] | None = metadata_by_file_location, reverse: bool = False):
+        super().sort(key = key, reverse = reverse)
+        self._sorted = key is metadata_by_file_location and not reverse
+        self.reindex()
+    
+    def _ensure_sorted(self):
+        """Sort by file location, if it isn't already."""
+        if not self._sorted:
+            self.sort(key = metadata_by_file_location)
+    
+    def append(self, metadata: FileMetadata):
+        if self._sorted and len(self) and metadata.file_location < self[-1].file_location:
+            self._sorted = False
+        self._by_path.setdefault(metadata.full_path, len(self))
+        super().append(metadata)
+    
+    def extend(self, metadatas: Iterable[FileMetadata]):
+        for metadata in metadatas:
+            self.append(metadata)
+    
+    def __iadd__(self, metadatas: Iterable[FileMetadata]):
+        self.extend(metadatas)
+        return self
+    
+    def insert(self, index: int, metadata: FileMetadata):
+        super().insert(index, metadata)
+        self._sorted = False
+        self.reindex()
+    
+    def remove(self, value: str | FileMetadata):
+        del self[self.index(value)]
+    
+    def pop(self, index: int = -1) -> FileMetadata:
+        result = super().pop(index)
+        self.reindex()
+        return result
+    
+    def clear(self):
+        super().clear()
+        self._sorted = True
+        self._by_path.clear()
+    
+    def reverse(self):
+        super().reverse()
+        self._sorted = False
+        self.reindex()
         
     def __getitem__(self, key: str | int) -> FileMetadata:
         if isinstance(key, str):
-            for index, value in enumerate(self):
-                if value.full_path == key:
-                    key = index
-                    break
+            index = self._by_path.get(key)
+            if index is None:
+                raise KeyError(key)
+            key = index
         
         return super().__getitem__(key)
 
     def __setitem__(self, key: str | int, value: FileMetadata):
         if isinstance(key, str):
-            for index, value in enumerate(self):
-                if value.full_path == key:
-                    key = index
-                    break
+            index = self._by_path.get(key)
+            if index is None:
+                value.full_path = key
+                self.append(value)
+                return
+            key = index
         
+        super().__setitem__(key, value)
+        self._sorted = False
+        self.reindex()
+    
+    def __delitem__(self, key: str | int):
         if isinstance(key, str):
-            value.full_path = key
-            self.append(value)
-            return
+            index = self._by_path.get(key)
+            if index is None:
+                raise KeyError(key)
+            key = index
         
-        return super().__setitem__(key, value)
+        super().__delitem__(key)
+        self.reindex()
     
     def index(self, value: str | FileMetadata, start: int = 0, stop: int = sys.maxsize):
         if isinstance(value, str):
+            index = self._by_path.get(value)
+            if index is not None and start <= index < stop:
+                return index
             for index in range(start, min(stop, len(self))):
                 if self[index].full_path == value:
                     return index
@@ -767,11 +1036,12 @@ class ARKMetadataCollection(list):
     def copy(self):
         return ARKMetadataCollection(self)
     
+    def __reduce__(self):
+        return (type(self), (list(self),))
+    
     def __contains__(self, value: FileMetadata | str):
         if isinstance(value, str):
-            for metadata in self:
-                if metadata.full_path == value:
-                    return True
+            return value in self._by_path
         return super().__contains__(value)
     
     def __iter__(self) -> Iterator[FileMetadata]:
@@ -1,7 +1,7 @@
 import os
 from argparse import ArgumentParser, Namespace
 
-from rich.progress import Progress, track
+from rich.progress import Progress
 
 from ..console import console
 from ._actions import GlobFiles
@@ -54,6 +54,20 @@ class ARKParser(CLICommand):
             action = 'store_true',
             help = 'print data version from ark files',
         )
+        
+        parser.add_argument(
+            '--no-verify',
+            dest = 'verify',
+            action = 'store_false',
+            help = "don't check the md5 hash of extracted files",
+        )
+        
+        parser.add_argument(
+            '-j', '--jobs',
+            dest = 'jobs',
+            type = int,
+            help = 'number of files to extract at the same time. Defaults to the number of CPUs',
+        )
     
     @classmethod
     def run_command(cls, args: Namespace):
@@ -61,7 +75,7 @@ class ARKParser(CLICommand):
         import fnmatch
         from glob import glob
         
-        from ..ark import ARK
+        from ..ark import ARK, FileMetadata
         from ..ark_filename import sort_ark_filenames
             
         output = './'
@@ -89,36 +103,36 @@ class ARKParser(CLICommand):
             output = os.path.splitext(os.path.basename(args.files[0]))[0]
         
         def extract_all(ark_file: ARK, output: str):
-            failed = []
+            files_to_extract = [
+                file_metadata for file_metadata in ark_file.files
+                if not args.filter or fnmatch.fnmatch(file_metadata.full_path, args.filter)
+            ]
             
-            for file_metadata in track(
-                ark_file.files,
-                console = console,
-                description = 'Extracting...',
-            ):
-                if args.filter and (not fnmatch.fnmatch(file_metadata.full_path, args.filter)):
-                    continue
+            with Progress(console = console) as progress:
+                task = progress.add_task('Extracting...', total = len(files_to_extract))
                 
-                console.print(f'extracting: [yellow]{file_metadata.full_path}[/yellow]')
-                try:
-                    file = ark_file.read_file(file_metadata)
-                    file.save(os.path.join(output, file_metadata.full_path))
-                except Exception as e:
-                    if args.ignore_errors:
-                        failed.append(file_metadata.full_path)
-                        console.print(f'[red]could not extract {file_metadata.full_path}[/red]')
-                        continue
+                def on_extract(file_metadata: FileMetadata, error: Exception | None):
+                    if error is None:
+                        console.print(f'extracting: [yellow]{file_metadata.full_path}[/yellow]')
                     else:
-                        e.add_note(f'file: {file_metadata.full_path}')
-                        raise e
+                        console.print(f'[red]could not extract {file_metadata.full_path}[/red]')
+                    progress.advance(task)
+                
+                failed = ark_file.extract_all(
+                    output,
+                    files_to_extract,
+                    workers = args.jobs,
+                    ignore_errors = args.ignore_errors,
+                    callback = on_extract,
+                )
             
-            return failed
+            return [file_metadata.full_path for file_metadata, _ in failed]
         
         versions = {}
         
         if len(files) == 1:
             console.print(f'Opening: [yellow]{files[0]}[/]')
-            with ARK(files[0]) as ark_file:
+            with ARK(files[0], verify = args.verify) as ark_file:
                 if args.data_version:
                     version = ark_file.data_version
                     if version:
@@ -135,7 +149,7 @@ class ARKParser(CLICommand):
                     path = output
                 
                 console.print(f'Opening: [yellow]{filename}[/]')
-                with ARK(filename) as ark_file:
+                with ARK(filename, verify = args.verify) as ark_file:
                     if args.data_version:
                         version = ark_file.data_version
                         if version:
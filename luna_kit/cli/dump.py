@@ -188,23 +188,26 @@ class DumpCommand(CLICommand):
             extracted_folders.add(folder)
             try:
                 with ARK(ark_filename) as ark:
-                    for file_metadata in track(
-                        ark.files,
-                        description = os.path.basename(ark_filename),
-                        transient = True,
-                    ):
-                        if args.filter and (not fnmatch(file_metadata.full_path, args.filter)):
-                            continue
-                        try:
-                            file = ark.extract(file_metadata)
-                            filepath = os.path.join(folder, file_metadata.full_path)
-                            file.save(filepath)
-                        except Exception as e:
-                            e.add_note(f'filename: {file_metadata.full_path}')
-                            if args.ignore_errors:
-                                console.print(e)
-                            else:
-                                raise e
+                    files_to_extract = [
+                        file_metadata for file_metadata in ark.files
+                        if not args.filter or fnmatch(file_metadata.full_path, args.filter)
+                    ]
+                    
+                    with Progress(*COLUMNS, console = console, transient = True) as progress:
+                        extract_progress = progress.add_task(
+                            os.path.basename(ark_filename),
+                            total = len(files_to_extract),
+                        )
+                        
+                        failed = ark.extract_all(
+                            folder,
+                            files_to_extract,
+                            ignore_errors = args.ignore_errors,
+                            callback = lambda file_metadata, error: progress.advance(extract_progress),
+                        )
+                    
+                    for file_metadata, e in failed:
+                        console.print(e)
             except Exception as e:
                 e.add_note(f'ark: {os.path.basename(ark_filename)}')
                 raise e
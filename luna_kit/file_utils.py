@@ -35,6 +35,41 @@ def get_filesize(file: IO):
     file.seek(pos)
     return size
 
+def move_file_data(file: BinaryIO, start: int, end: int, offset: int, chunk_size: int = 1 << 20):
+    """Move the data between `start` and `end` in `file` by `offset` bytes, one chunk at a time.
+
+    Only `chunk_size` bytes are held in memory at once, so this can be used to shift the rest of a large file.
+
+    Args:
+        file (BinaryIO): File-like object open in read and write binary mode.
+        start (int): Start of the data to move.
+        end (int): End of the data to move.
+        offset (int): Number of bytes to move the data by. Can be negative.
+        chunk_size (int, optional): Number of bytes to copy at a time. Defaults to 1 MiB.
+    """
+    if offset == 0 or end <= start:
+        return
+    
+    if offset > 0:
+        # Copy from the end, so nothing gets overwritten before it's been moved
+        pos = end
+        while pos > start:
+            size = min(chunk_size, pos - start)
+            pos -= size
+            file.seek(pos)
+            chunk = file.read(size)
+            file.seek(pos + offset)
+            file.write(chunk)
+    else:
+        pos = start
+        while pos < end:
+            size = min(chunk_size, end - pos)
+            file.seek(pos)
+            chunk = file.read(size)
+            file.seek(pos + offset)
+            file.write(chunk)
+            pos += size
+
 PathOrBinaryFile: TypeAlias = str | bytes | bytearray | BinaryIO
 PathOrTextFile: TypeAlias = str | TextIO
 PathOrFile: TypeAlias = PathOrBinaryFile | PathOrTextFile
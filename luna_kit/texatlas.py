@@ -11,6 +11,35 @@ from .utils import posix_path, strToInt
 from .pvr import PVR
 
 
+def _to_int(value: str | None) -> int:
+    # Values are almost always plain ints, so only fall back to the slower
+    # `strToInt` for anything else.
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return strToInt(value)
+
+def _parse_atlas_row(row: list[str]) -> dict[str, str | int]:
+    """Convert a row of a texatlas file into a dict.
+
+    Args:
+        row (list[str]): The row values, `filename`, `atlas`, `x`, `y`, `width`, `height`.
+
+    Returns:
+        dict[str, str | int]: The image info.
+    """
+    if len(row) < 6:
+        row = row + [None] * (6 - len(row))
+    
+    return {
+        'filename': row[0],
+        'atlas': row[1],
+        'x': _to_int(row[2]),
+        'y': _to_int(row[3]),
+        'width': _to_int(row[4]),
+        'height': _to_int(row[5]),
+    }
+
 class TexAtlas():
     def __init__(
         self,
@@ -32,18 +61,12 @@ class TexAtlas():
             context_manager = file
         
         with context_manager as csvfile:
-            self.image_info = list({
-                    **line,
-                    'x': strToInt(line.get('x', 0)),
-                    'y': strToInt(line.get('y', 0)),
-                    'width': strToInt(line.get('width', 0)),
-                    'height': strToInt(line.get('height', 0)),
-                } for line in csv.DictReader(
+            self.image_info = [
+                _parse_atlas_row(row) for row in csv.reader(
                     csvfile,
-                    ['filename', 'atlas', 'x', 'y', 'width', 'height'],
                     delimiter = '\t',
-                )
-            )
+                ) if row
+            ]
         
         if search_folders == None:
             search_folders = ['.']
@@ -56,21 +79,20 @@ class TexAtlas():
     def get_images(self):
         self.images: list[Texture] = []
         
-        atlas_file = ''
-        atlas_image = None
+        # Each atlas is only looked up and opened once, no matter how the rows are ordered.
+        atlases: dict[str, tuple[str, Image.Image]] = {}
         
         for image_data in self.image_info:
-            new_atlas_file = self.find_file(image_data['atlas'])
-            
-            if (not atlas_file) or (not os.path.samefile(
-                atlas_file,
-                new_atlas_file,
-            )):
-                atlas_file = new_atlas_file
+            atlas = atlases.get(image_data['atlas'])
+            if atlas is None:
+                atlas_file = self.find_file(image_data['atlas'])
                 if atlas_file.endswith('.pvr'):
                     atlas_image = PVR(atlas_file).image
                 else:
                     atlas_image = Image.open(atlas_file)
+                atlas = atlases[image_data['atlas']] = (atlas_file, atlas_image)
+            
+            atlas_file, atlas_image = atlas
             
             self.images.append(
                 Texture(
@@ -79,8 +101,8 @@ class TexAtlas():
                     atlas_image.crop((
                         image_data['x'],
                         image_data['y'],
-                        image_data['x'] + image_data['width'] - 1,
-                        image_data['y'] + image_data['height'] - 1,
+                        image_data['x'] + image_data['width'],
+                        image_data['y'] + image_data['height'],
                     )),
                     dir = posix_path(os.path.dirname(atlas_file))
                 )
@@ -97,8 +119,8 @@ class TexAtlas():
             atlas_image.crop((
                 image_data['x'],
                 image_data['y'],
-                image_data['x'] + image_data['width'] - 1,
-                image_data['y'] + image_data['height'] - 1,
+                image_data['x'] + image_data['width'],
+                image_data['y'] + image_data['height'],
             )),
             dir = posix_path(atlas_file).removesuffix('/' + posix_path(image_data['atlas']))
         )
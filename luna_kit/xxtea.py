@@ -1,9 +1,8 @@
-import math
 import struct
-from ctypes import *
-from ctypes import c_uint32
 from typing import Annotated
 
+DELTA = 0x9e3779b9
+
 
 def get_phdr_size(phdr_off: int):
     if (phdr_off & 3):
@@ -13,45 +12,33 @@ def get_phdr_size(phdr_off: int):
     return phdr_off
 
 
+# The rounds work on plain ints and only mask to 32 bits when storing a word.
+# Every operation in MX other than `>>` only carries bits upwards, and `>>` is
+# only ever applied to masked words, so the result is the same as doing all
+# the math in uint32.
+
 def decrypt(src: bytes | bytearray, key: Annotated[list[int], 4]):
     n = get_phdr_size(len(src)) // 4
     
-    v = [c_uint(x) for x in struct.unpack(
-        f'{n}I',
-        src,
-    )]
-
-    key: list[c_uint32] = [c_uint32(k) for k in key]
-
-    DELTA = 0x9e3779b9
-
-    y = c_uint32(0)
-    z = c_uint32(0)
-    p = 0
-    e = c_uint32(0)
-
-    def MX():
-        return (((z.value >> 5 ^ y.value << 2) + (y.value >> 3 ^ z.value << 4)) ^ ((sum.value ^ y.value) + (key[(p & 3) ^ e.value].value ^ z.value)))
+    v = list(struct.unpack(f'<{n}I', src))
+    key = [k & 0xFFFFFFFF for k in key]
 
     rounds = 6 + (52 // n)
-    sum = c_uint32(rounds * DELTA)
-    y.value = v[0].value
+    sum = (rounds * DELTA) & 0xFFFFFFFF
+    y = v[0]
 
     while (rounds):
-        e.value = (sum.value >> 2) & 3
+        e = (sum >> 2) & 3
         for p in range(n - 1, 0, -1):
-            z.value = v[p-1].value
-            v[p].value -= MX()
-            y.value = v[p].value
-        p = 0
-        z.value = v[n - 1].value
-        v[0].value -= MX()
-        y.value = v[0].value
-        sum.value -= DELTA
+            z = v[p - 1]
+            y = v[p] = (v[p] - ((((z >> 5) ^ (y << 2)) + ((y >> 3) ^ (z << 4))) ^ ((sum ^ y) + (key[(p & 3) ^ e] ^ z)))) & 0xFFFFFFFF
+        z = v[n - 1]
+        y = v[0] = (v[0] - ((((z >> 5) ^ (y << 2)) + ((y >> 3) ^ (z << 4))) ^ ((sum ^ y) + (key[e] ^ z)))) & 0xFFFFFFFF
+        sum = (sum - DELTA) & 0xFFFFFFFF
 
         rounds -= 1
 
-    return b''.join([bytes(x) for x in v])
+    return struct.pack(f'<{n}I', *v)
 
 def encrypt(src: bytes | bytearray, key: Annotated[list[int], 4]):
     n = get_phdr_size(len(src)) // 4
@@ -59,40 +46,34 @@ def encrypt(src: bytes | bytearray, key: Annotated[list[int], 4]):
     if n != len(src) // 4:
         src += b'\x00' * (4 - (len(src) % 4))
 
-    v = [c_uint(x) for x in struct.unpack(
-        f'{n}I',
-        src,
-    )]
-
-    key: list[c_uint32] = [c_uint32(k) for k in key]
-
-    DELTA = 0x9e3779b9
-
-    y = c_uint32(0)
-    z = c_uint32(0)
-    p = 0
-    e = c_uint32(0)
-
-    def MX():
-        return (((z.value >> 5 ^ y.value << 2) + (y.value >> 3 ^ z.value << 4)) ^ ((sum.value ^ y.value) + (key[(p & 3) ^ e.value].value ^ z.value)))
+    v = list(struct.unpack(f'<{n}I', src))
+    key = [k & 0xFFFFFFFF for k in key]
 
     rounds = 6 + (52 // n)
-    sum = c_uint32(0)
-    z.value = v[n - 1].value
+    sum = 0
+    z = v[n - 1]
 
     while (rounds):
-        sum.value += DELTA
+        sum = (sum + DELTA) & 0xFFFFFFFF
         
-        e.value = (sum.value >> 2) & 3
+        e = (sum >> 2) & 3
         for p in range(0, n - 1, 1):
-            y.value = v[p + 1].value
-            v[p].value += MX()
-            z.value = v[p].value
-        p = n - 1
-        y.value = v[0].value
-        v[n - 1].value += MX()
-        z.value = v[n - 1].value
+            y = v[p + 1]
+            z = v[p] = (v[p] + ((((z >> 5) ^ (y << 2)) + ((y >> 3) ^ (z << 4))) ^ ((sum ^ y) + (key[(p & 3) ^ e] ^ z)))) & 0xFFFFFFFF
+        y = v[0]
+        z = v[n - 1] = (v[n - 1] + ((((z >> 5) ^ (y << 2)) + ((y >> 3) ^ (z << 4))) ^ ((sum ^ y) + (key[((n - 1) & 3) ^ e] ^ z)))) & 0xFFFFFFFF
 
         rounds -= 1
 
-    return b''.join([bytes(x) for x in v])
+    return struct.pack(f'<{n}I', *v)
+
+def decrypt_into(buffer: bytearray | memoryview, key: Annotated[list[int], 4]):
+    """Decrypt a writable buffer in place."""
+    buffer[:] = decrypt(buffer, key)
+
+
+# Use the C extension when it was built.
+try:
+    from ._xxtea import decrypt, decrypt_into, encrypt
+except ImportError:
+    pass